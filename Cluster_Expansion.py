@@ -1,9 +1,27 @@
 from onsager import cluster
 import numpy as np
 import collections
-import itertools
 import Transitions
 import time
+from numba import jit, prange
+
+
+# Cache for site transforms under group operations. recalcClusters applies the same
+# group ops to the same small set of cluster sites over and over across occupancies,
+# so the coordinate work is memoized. The crystal object itself is part of the key
+# (the transform depends on the basis) - this keeps it referenced, so a recycled id
+# can never alias entries across different crystals.
+_siteGCache = {}
+
+
+def _transformSite(site, crys, g):
+    key = (site, g, crys)
+    try:
+        return _siteGCache[key]
+    except KeyError:
+        newSite = site.g(crys, g)
+        _siteGCache[key] = newSite
+        return newSite
 
 
 class ClusterSpecies():
@@ -18,30 +36,32 @@ class ClusterSpecies():
         self.specList = specList
         self.siteList = siteList
         Rtrans = sum([site.R for site in siteList])//len(siteList)
-        self.transPairs = [(site-Rtrans, spec) for site, spec in zip(siteList, specList)]
-        # self.transPairs = sorted(self.transPairs, key=lambda x: x[1])
-        self.SiteSpecs = set(self.transPairs)
-        # self.__hashcache__ = int(hash(tuple([hash((site, spec)) for site, spec in self.transPairs])))
-        # self.__hashcache__ = int(np.prod(np.array([hash((site, spec)) for site, spec in self.transPairs]))) +\
-        #                      sum([hash((site, spec)) for site, spec in self.transPairs])
+        # transPairs keeps the deterministic construction order for iteration;
+        # the frozenset carries equality/hash semantics, and caches its element hashes
+        # so equality tests and set membership don't have to re-hash the cluster sites.
+        self.transPairs = tuple((site-Rtrans, spec) for site, spec in zip(siteList, specList))
+        self.SiteSpecs = frozenset(self.transPairs)
 
-        self.__hashcache__ = sum([hash((site, spec)) for site, spec in self.transPairs])
-        # self.__hashcache__ = hash(tuple(self.transPairs))
+        self.__hashcache__ = hash(self.SiteSpecs)
 
     def __eq__(self, other):
-        if self.SiteSpecs == other.SiteSpecs:
+        # identity and cached-hash checks short-circuit the set comparison - unequal
+        # clusters almost always differ in hash, and set equality is the expensive path
+        if self is other:
             return True
-        return False
+        if self.__hashcache__ != other.__hashcache__:
+            return False
+        return self.SiteSpecs == other.SiteSpecs
 
     def __hash__(self):
         return self.__hashcache__
 
     def g(self, crys, g):
-        return self.__class__(self.specList, [site.g(crys, g) for site in self.siteList])
+        return self.__class__(self.specList, [_transformSite(site, crys, g) for site in self.siteList])
 
     def strRep(self):
         str= ""
-        for site, spec in self.SiteSpecs:
+        for site, spec in self.transPairs:
             str += "Spec:{}, site:{},{} ".format(spec, site.ci, site.R)
         return str
 
@@ -80,6 +100,11 @@ class VectorClusterExpansion(object):
         self.vacSite = vacSite  # This stays fixed throughout the simulation, so makes sense to store it.
         self.jumpnetwork = jumpnetwork
 
+        # Tabulate supercell indices once - sup.index does modular arithmetic and a dict
+        # lookup per call, and the interaction-generation loops call it for every cluster
+        # site at every supercell site. All of them share this table instead.
+        self.makeSiteIndexTable()
+
         start = time.time()
         self.SpecClusters = self.recalcClusters()
         print("Generated clusters with species: {:.4f}".format(time.time()-start))
@@ -103,6 +128,23 @@ class VectorClusterExpansion(object):
         # Generate the complete cluster basis including the arrangement of species on sites other than the vacancy site.
         self.KRAexpander = Transitions.KRAExpand(sup, self.chem, jumpnetwork, maxorderTrans, Tclusexp, NSpec, Nvac, vacSite)
 
+    def makeSiteIndexTable(self):
+        """
+        Tabulate the supercell index of every (lattice vector, basis site) pair, so hot
+        loops can wrap a lattice vector modulo the supercell and read the index directly
+        instead of going through sup.index.
+        """
+        self.N_units = self.sup.superlatt[0, 0]
+        # the modulo wrapping below is only valid for diagonal N x N x N supercells -
+        # fail loudly rather than building a silently wrong table for anything else.
+        assert np.array_equal(self.sup.superlatt, self.N_units * np.eye(3, dtype=int)), \
+            "site index table requires a diagonal N x N x N supercell"
+        Nbasis = len(self.crys.basis[self.chem])
+        self.siteIndexTable = np.full((self.N_units, self.N_units, self.N_units, Nbasis), -1, dtype=int)
+        for siteInd in range(self.Nsites):
+            ci, R = self.sup.ciR(siteInd)
+            self.siteIndexTable[R[0] % self.N_units, R[1] % self.N_units, R[2] % self.N_units, ci[1]] = siteInd
+
     def recalcClusters(self):
         """
         Intended to take in a site based cluster expansion and recalculate the clusters with species in them
@@ -112,20 +154,37 @@ class VectorClusterExpansion(object):
         for clSet in self.clusexp:
             for clust in list(clSet):
                 Nsites = len(clust.sites)
-                occupancies = list(itertools.product(self.mobList, repeat=Nsites))
-                for siteOcc in occupancies:
+                # The group action only moves the sites, not the species decoration, so the
+                # transformed site lists are the same for every occupancy - build them once
+                # per bare cluster instead of once per (occupancy, group op) pair.
+                # Group ops in the kernel of the action on the ordered site list produce the
+                # same decorated cluster for every occupancy, so keep only one copy of each
+                # distinct transformed list. Ops that merely permute the sites must be kept -
+                # the decoration rides along positionally, so they can decorate differently.
+                gSiteLists = []
+                seenSiteLists = set()
+                for g in self.crys.G:
+                    gSites = [_transformSite(site, self.crys, g) for site in clust.sites]
+                    key = tuple(gSites)
+                    if key not in seenSiteLists:
+                        seenSiteLists.add(key)
+                        gSiteLists.append(gSites)
+                # Enumerate the occupancies by mixed-radix (base-NSpec) counting - the exponents are
+                # reversed so the rows come out in the same order as itertools.product would give them.
+                occupancies = (np.arange(self.NSpec**Nsites)[:, None] //
+                               self.NSpec**np.arange(Nsites - 1, -1, -1)) % self.NSpec
+                # Throw out occupancies with more vacancies than allowed before making any objects
+                occupancies = occupancies[np.count_nonzero(occupancies == self.vacSpec, axis=1) <= self.Nvac]
+                for row in occupancies:
+                    siteOcc = tuple(row.tolist())
                     # Make the cluster site object
                     ClustSpec = ClusterSpecies(siteOcc, clust.sites)
                     # check if this has already been considered
                     if ClustSpec in allClusts:
                         continue
-                    # Check if number of each species in the cluster is okay
-                    mobcount = collections.Counter(siteOcc)
-                    # Check if the number of vacancies is kept to the allowed number
-                    if mobcount[self.vacSpec] > self.Nvac:
-                        continue
-                    # Otherwise, find all symmetry-grouped counterparts
-                    newSymSet = set([ClustSpec.g(self.crys, g) for g in self.crys.G])
+                    # Otherwise, find all symmetry-grouped counterparts by decorating the
+                    # pre-transformed site lists
+                    newSymSet = set([ClusterSpecies(siteOcc, gSites) for gSites in gSiteLists])
                     allClusts.update(newSymSet)
                     newList = list(newSymSet)
                     symClusterList.append(newList)
@@ -137,17 +196,29 @@ class VectorClusterExpansion(object):
         vecClustList = []
         vecVecList = []
         clus2LenVecClus = np.zeros(len(specClusters), dtype=int)
+
+        # First pass - accumulate the stabilizer projector of every symmetry group. G0
+        # averages an orthogonal group, so it is a symmetric projector onto the invariant
+        # subspace; stacking them lets one batched call to the symmetric eigensolver
+        # replace a LAPACK dispatch per group.
+        # The group images of each representative are needed again when collecting the
+        # orbits below, so they are kept around rather than rebuilt - applying a group op
+        # constructs a whole new cluster object, which is the expensive part.
+        G0_batch = np.zeros((len(specClusters), 3, 3))
+        gImagesList = []
+        for clListInd, clList in enumerate(specClusters):
+            cl0 = clList[0]
+            gImages = [(g, cl0.g(self.crys, g)) for g in self.crys.G]
+            gImagesList.append(gImages)
+            glist0 = [g for g, cl1 in gImages if cl1 == cl0]
+            G0_batch[clListInd] = sum([g.cartrot for g in glist0])/len(glist0)
+
+        vals_batch, vecs_batch = np.linalg.eigh(G0_batch)
+
         for clListInd, clList in enumerate(specClusters):
             cl0 = clList[0]
-            glist0 = []
-            for g in self.crys.G:
-                if cl0.g(self.crys, g) == cl0:
-                    glist0.append(g)
-
-            G0 = sum([g.cartrot for g in glist0])/len(glist0)
-            vals, vecs = np.linalg.eig(G0)
-            vecs = np.real(vecs)
-            vlist = [vecs[:, i]/np.linalg.norm(vecs[:, i]) for i in range(3) if np.isclose(vals[i], 1.0)]
+            vals, vecs = vals_batch[clListInd], vecs_batch[clListInd]
+            vlist = [vecs[:, i] for i in range(3) if np.isclose(vals[i], 1.0)]
             clus2LenVecClus[clListInd] = len(vlist)
 
             if clus2LenVecClus[clListInd] == 0:  # If the vector basis is empty, don't consider the cluster
@@ -155,14 +226,20 @@ class VectorClusterExpansion(object):
                 # vecVecList.append([np.zeros(3) for i in range(len(clList))])
                 continue
 
+            # the group images computed during the stabilizer pass serve every basis vector
+            gImages = gImagesList[clListInd]
+
             for v in vlist:
                 newClustList = [cl0]
                 # The first cluster being the same helps in indexing
                 newVecList = [v]
-                for g in self.crys.G:
-                    cl1 = cl0.g(self.crys, g)
-                    if cl1 in newClustList:
+                # membership is checked against a set - the list scan was quadratic in
+                # the orbit size
+                seen = {cl0}
+                for g, cl1 in gImages:
+                    if cl1 in seen:
                         continue
+                    seen.add(cl1)
                     newClustList.append(cl1)
                     newVecList.append(np.dot(g.cartrot, v))
 
@@ -175,31 +252,33 @@ class VectorClusterExpansion(object):
 
         self.Vclus2Clus = np.zeros(len(self.vecClus), dtype=int)
         self.Clus2VClus = collections.defaultdict(list)
+        # genVecClustBasis keeps the representative cluster first in every vector cluster group,
+        # so a single hash map replaces the scan over all vector cluster groups.
+        firstClus2VClusInds = collections.defaultdict(list)
+        for vClusListInd, vClusList in enumerate(self.vecClus):
+            firstClus2VClusInds[vClusList[0]].append(vClusListInd)
+
         for cLlistInd, clList in enumerate(self.SpecClusters):
             if self.clus2LenVecClus[cLlistInd] == 0:  # If the vector basis is empty, don't consider the cluster
                 self.Clus2VClus[cLlistInd] = []
                 continue
             cl0 = clList[0]
-            for vClusListInd, vClusList in enumerate(self.vecClus):
-                clVec0 = vClusList[0]
-                if clVec0 == cl0:
-                    self.Vclus2Clus[vClusListInd] = cLlistInd
-                    self.Clus2VClus[cLlistInd].append(vClusListInd)
+            for vClusListInd in firstClus2VClusInds[cl0]:
+                self.Vclus2Clus[vClusListInd] = cLlistInd
+                self.Clus2VClus[cLlistInd].append(vClusListInd)
 
     def indexClustertoVecClus(self):
         """
         For a given cluster, store which vector cluster it belongs to
         """
+        # a single pass over the vector cluster lists records each cluster's positions
+        # directly - no comparisons needed, since membership is the position itself.
+        # Iterating groups in ascending order keeps each cluster's list sorted the same
+        # way the old scan over Clus2VClus produced it.
         self.clust2vecClus = collections.defaultdict(list)
-        for clListInd, clList in enumerate(self.SpecClusters):
-            if self.clus2LenVecClus[clListInd] == 0:  # If the vector basis is empty, don't consider the cluster
-                continue
-            vecClusIndList = self.Clus2VClus[clListInd]
-            for clust1 in clList:
-                for vecClusInd in vecClusIndList:
-                    for clust2Ind, clust2 in enumerate(self.vecClus[vecClusInd]):
-                        if clust1 == clust2:
-                            self.clust2vecClus[clust1].append((vecClusInd, clust2Ind))
+        for vecClusInd, clList in enumerate(self.vecClus):
+            for clustInd, clust in enumerate(clList):
+                self.clust2vecClus[clust].append((vecClusInd, clustInd))
 
     def indexClustertoSpecClus(self):
         """
@@ -214,19 +293,33 @@ class VectorClusterExpansion(object):
         """
         generate interactions for every site - for MC moves
         """
+        # First, group the (site, species) pairs of all the clusters by the sublattice of the site,
+        # so that the site loop below only walks pairs that can actually anchor an interaction there.
+        # The deterministic transPairs tuples are used for iteration - set iteration order
+        # is arbitrary, while the pair tuples are materialized once at construction.
+        pairsByCi = collections.defaultdict(list)
+        for clist in self.SpecClusters:
+            for cl in clist:
+                clPairs = cl.transPairs
+                for site, spec in clPairs:
+                    pairsByCi[site.ci].append((cl, site, spec, clPairs))
+
+        N_units = self.N_units
+        siteIndexTable = self.siteIndexTable
+
         SiteSpecinteractList = collections.defaultdict(list)
         for siteInd in range(self.Nsites):
             # get the cluster site
             ci, R = self.sup.ciR(siteInd)
             clSite = cluster.ClusterSite(ci=ci, R=R)
-            # Now, go through all the clusters
-            for cl in [cl for clist in self.SpecClusters for cl in clist]:
-                for site, spec in cl.SiteSpecs:
-                    if site.ci == ci: # In our case we have only one chemistry.
-                        Rtrans = R - site.R
-                        interactSupInd = tuple([(self.sup.index(site.R+Rtrans, site.ci)[0], spec)
-                                                for site, spec in cl.SiteSpecs])
-                        SiteSpecinteractList[(clSite, spec)].append([interactSupInd, cl, Rtrans])
+            # Now, go through the clusters anchored on this sublattice
+            for (cl, site, spec, clPairs) in pairsByCi[ci]:
+                Rtrans = R - site.R
+                interactSupInd = tuple([(siteIndexTable[(st.R[0] + Rtrans[0]) % N_units,
+                                                        (st.R[1] + Rtrans[1]) % N_units,
+                                                        (st.R[2] + Rtrans[2]) % N_units, st.ci[1]], sp)
+                                        for st, sp in clPairs])
+                SiteSpecinteractList[(clSite, spec)].append([interactSupInd, cl, Rtrans])
 
         maxinteractions = max([len(lst) for key, lst in SiteSpecinteractList.items()])
         return SiteSpecinteractList, maxinteractions
@@ -236,12 +329,10 @@ class VectorClusterExpansion(object):
         Assign a unique integer to each representative cluster. To help identifying them in JIT operations
         """
         allSpCl = [SpCl for SpClList in self.SpecClusters for SpCl in SpClList]
-        self.Clus2Num = {}
-        self.Num2Clus = {}
-
-        for i, SpCl in enumerate(allSpCl):
-            self.Clus2Num[SpCl] = i
-            self.Num2Clus[i] = SpCl
+        # the indices are just the enumeration order, so the flat list already is the
+        # index-to-cluster map - only the reverse direction needs a dict
+        self.Num2Clus = allSpCl
+        self.Clus2Num = {SpCl: i for i, SpCl in enumerate(allSpCl)}
 
     def makeJitInteractionsData(self, Energies):
         """
@@ -265,9 +356,20 @@ class VectorClusterExpansion(object):
         numInteractsSiteSpec = np.zeros((self.Nsites, self.NSpec), dtype=int)
         SiteSpecInterArray = np.full((self.Nsites, self.NSpec, self.maxInteractCount), -1, dtype=int)
 
+        # per-field lists, filled as each new interaction is discovered - these become the
+        # typed arrays below in one shot, instead of a second dense-matrix population pass
+        numSitesList = []
+        sitesFlat = []
+        specsFlat = []
+        repClusIndList = []
+        symClassList = []
+
         count = 0  # to keep a steady count of interactions.
         for key, interactInfoList in self.SiteSpecInteractions.items():
-            keySite = self.sup.index(key[0].R, key[0].ci)[0]  # the "index" function applies PBC to sites outside sup.
+            keyR, keyci = key[0].R, key[0].ci
+            # the table lookup applies PBC the same way sup.index would
+            keySite = self.siteIndexTable[keyR[0] % self.N_units, keyR[1] % self.N_units,
+                                          keyR[2] % self.N_units, keyci[1]]
             keySpec = key[1]
             numInteractsSiteSpec[keySite, keySpec] = len(interactInfoList)
             for interactInd, interactInfo in enumerate(interactInfoList):
@@ -279,12 +381,20 @@ class VectorClusterExpansion(object):
                 else:
                     # assign a new unique integer to this interaction
                     InteractionIndexDict[interaction] = count
-                    repClustCounter[interactInfo[1]] += 1
+                    repClus = interactInfo[1]
+                    repClustCounter[repClus] += 1
                     # also sort the sites by the supercell site indices - will help in identifying TSclusters as interactions
                     # later on
-                    InteractionRepClusDict[interaction] = interactInfo[1]
+                    InteractionRepClusDict[interaction] = repClus
                     Index2InteractionDict[count] = interaction
                     SiteSpecInterArray[keySite, keySpec, interactInd] = count
+                    # record the per-interaction fields while we have everything in hand
+                    numSitesList.append(len(interaction))
+                    for (intSite, intSpec) in interaction:
+                        sitesFlat.append(intSite)
+                        specsFlat.append(intSpec)
+                    repClusIndList.append(self.Clus2Num[repClus])
+                    symClassList.append(self.clust2SpecClus[repClus][0])
                     count += 1
 
         print("Done Indexing interactions : {}".format(time.time() - start))
@@ -294,50 +404,31 @@ class VectorClusterExpansion(object):
         # 1. Store chemical data
         start = time.time()
         # we'll need the number of sites in each interaction
-        numSitesInteracts = np.zeros(numInteracts, dtype=int)
+        numSitesInteracts = np.array(numSitesList, dtype=int)
 
-        # and the supercell sites in each interaction
+        # and the supercell sites in each interaction, along with the species on them -
+        # scatter the flat per-site lists into the padded matrices with one masked assignment
         SupSitesInteracts = np.full((numInteracts, self.maxOrder), -1, dtype=int)
-
-        # and the species on the supercell sites in each interaction
         SpecOnInteractSites = np.full((numInteracts, self.maxOrder), -1, dtype=int)
+        siteMask = np.arange(self.maxOrder)[None, :] < numSitesInteracts[:, None]
+        SupSitesInteracts[siteMask] = sitesFlat
+        SpecOnInteractSites[siteMask] = specsFlat
 
         # and we want to the know the symmetry class of each interaction
-        Interact2RepClusArray = np.full(numInteracts, -1, dtype=int)
-        Interact2SymClassArray = np.full(numInteracts, -1, dtype=int)
-
-        for (key, interaction) in Index2InteractionDict.items():
-            numSitesInteracts[key] = len(interaction)
-
-            # Now get the representative cluster
-            repClus = InteractionRepClusDict[interaction]
-
-            # Now get the index assigned to this cluster
-            clustInd = self.Clus2Num[repClus]
-            Interact2RepClusArray[key] = clustInd
-
-            # Now get the symmetry class for this representative cluster
-            (clListInd, clInd) = self.clust2SpecClus[repClus]
-
-            Interact2SymClassArray[key] = clListInd
-
-            for idx, (intSite, intSpec) in enumerate(interaction):
-                SupSitesInteracts[key, idx] = intSite
-                SpecOnInteractSites[key, idx] = intSpec
-
+        Interact2RepClusArray = np.array(repClusIndList, dtype=int)
+        Interact2SymClassArray = np.array(symClassList, dtype=int)
 
         print("Done with chemical and symmetry class data for interactions : {}".format(time.time() - start))
 
         # 2. Store energy data and vector data
         start = time.time()
-        Interaction2En = np.zeros(numInteracts, dtype=float)
+        # the energy of an interaction is that of its symmetry class - a single gather
+        Interaction2En = np.asarray(Energies)[Interact2SymClassArray]
         numVecsInteracts = np.full(numInteracts, -1, dtype=int)
         VecsInteracts = np.zeros((numInteracts, 3, 3))
         VecGroupInteracts = np.full((numInteracts, 3), -1, dtype=int)
         for interaction, repClus in InteractionRepClusDict.items():
             idx = InteractionIndexDict[interaction]
-            # get the energy index here
-            Interaction2En[idx] = Energies[self.clust2SpecClus[repClus][0]]
             # get the vector basis data here
             # if vector basis is empty, keep no of elements to -1.
             if self.clus2LenVecClus[self.clust2SpecClus[repClus][0]] == 0:
@@ -353,9 +444,14 @@ class VectorClusterExpansion(object):
 
         vacSiteInd = self.sup.index(self.vacSite.R, self.vacSite.ci)[0]
 
+        # keep the symmetry class maps on the instance - callers that unpack the jit
+        # arrays don't need them in the return tuple
+        self.Interact2RepClusArray = Interact2RepClusArray
+        self.Interact2SymClassArray = Interact2SymClassArray
+
         return numSitesInteracts, SupSitesInteracts, SpecOnInteractSites, Interaction2En, numVecsInteracts, VecsInteracts,\
                VecGroupInteracts, numInteractsSiteSpec, SiteSpecInterArray, vacSiteInd, InteractionIndexDict, InteractionRepClusDict,\
-               Index2InteractionDict, repClustCounter, Interact2RepClusArray, Interact2SymClassArray
+               Index2InteractionDict, repClustCounter
 
     def makeSiteIndToSite(self):
         Nsites = self.Nsites
@@ -369,6 +465,274 @@ class VectorClusterExpansion(object):
             RtoSiteInd[R[0], R[1], R[2]] = siteInd
         return siteIndtoR, RtoSiteInd
 
+@jit(nopython=True, cache=True)
+def MCSweepTrialsJit(mobOcc, OffSiteCount, SwapTrials, beta, randarr, Nswaptrials,
+                     Nspecs, ssIndPtr, ssIndices, ssEnergies):
+    """
+    Jit-compiled kernel for the Metropolis trial loop - keeps the hot swap loop out of
+    the interpreter. The arrays passed in are the same ones stored on MCSamplerClass -
+    interactions per (site, species) come in as a CSR layout: ssIndices holds the
+    interaction indices contiguously, with ssIndPtr offsets keyed on site*Nspecs + spec.
+    Deliberately kept serial and free of parallel regions, so the replica-batch kernel
+    can run one copy per thread.
+    :return: the energy change of the last attempted swap (stored for testing).
+    """
+    delE = 0.
+    # undo stack - records which offsite counts a trial touched and by how much, so a
+    # rejected trial is reverted with one replay instead of re-walking the four
+    # interaction slices. At most four slices are touched per trial.
+    maxSlice = (ssIndPtr[1:] - ssIndPtr[:-1]).max()
+    touched = np.zeros(4 * maxSlice, dtype=np.int64)
+    for swapcount in range(Nswaptrials):
+        # first select two random sites to swap - for now, let's just select naively.
+        siteA = SwapTrials[swapcount, 0]
+        siteB = SwapTrials[swapcount, 1]
+
+        specA = mobOcc[siteA]
+        specB = mobOcc[siteB]
+
+        delE = 0.
+        Ntouch = 0
+        # Next, switch required sites off
+        # the "is this interaction on" tests are ~50% taken in a disordered state, so
+        # the energy terms are accumulated branchlessly - the comparison result weights
+        # the energy instead of guarding it, letting the compiler avoid branch misses.
+        keyAA = siteA * Nspecs + specA
+        for k in range(ssIndPtr[keyAA], ssIndPtr[keyAA + 1]):
+            interMainInd = ssIndices[k]
+            delE -= ssEnergies[k] * (OffSiteCount[interMainInd] == 0)
+            OffSiteCount[interMainInd] += 1
+            touched[Ntouch] = interMainInd
+            Ntouch += 1
+
+        keyBB = siteB * Nspecs + specB
+        for k in range(ssIndPtr[keyBB], ssIndPtr[keyBB + 1]):
+            interMainInd = ssIndices[k]
+            delE -= ssEnergies[k] * (OffSiteCount[interMainInd] == 0)
+            OffSiteCount[interMainInd] += 1
+            touched[Ntouch] = interMainInd
+            Ntouch += 1
+
+        # Next, switch required sites on
+        NtouchOff = Ntouch
+        keyAB = siteA * Nspecs + specB
+        for k in range(ssIndPtr[keyAB], ssIndPtr[keyAB + 1]):
+            interMainInd = ssIndices[k]
+            OffSiteCount[interMainInd] -= 1
+            delE += ssEnergies[k] * (OffSiteCount[interMainInd] == 0)
+            touched[Ntouch] = interMainInd
+            Ntouch += 1
+
+        keyBA = siteB * Nspecs + specA
+        for k in range(ssIndPtr[keyBA], ssIndPtr[keyBA + 1]):
+            interMainInd = ssIndices[k]
+            OffSiteCount[interMainInd] -= 1
+            delE += ssEnergies[k] * (OffSiteCount[interMainInd] == 0)
+            touched[Ntouch] = interMainInd
+            Ntouch += 1
+
+        # do the selection test
+        if -beta * delE > randarr[swapcount]:
+            # swap the sites to get to the next state
+            mobOcc[siteA] = specB
+            mobOcc[siteB] = specA
+            # OffSiteCount is already updated to that of the new state.
+
+        else:
+            # revert back the off site counts, because the state has not changed -
+            # the first NtouchOff entries were incremented, the rest decremented
+            for t in range(NtouchOff):
+                OffSiteCount[touched[t]] -= 1
+            for t in range(NtouchOff, Ntouch):
+                OffSiteCount[touched[t]] += 1
+
+    return delE
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def MCSweepJit(mobOcc, OffSiteCount, TransOffSiteCount, SwapTrials, beta, randarr, Nswaptrials,
+               Nspecs, ssIndPtr, ssIndices, ssEnergies,
+               numSitesTSInteracts, TSInteractSites, TSInteractSpecs):
+    """
+    Single-chain Metropolis sweep - runs the serial trial loop, then rebuilds the
+    transition state offsite counts for the final configuration.
+    :return: the energy change of the last attempted swap (stored for testing).
+    """
+    delE = MCSweepTrialsJit(mobOcc, OffSiteCount, SwapTrials, beta, randarr, Nswaptrials,
+                            Nspecs, ssIndPtr, ssIndices, ssEnergies)
+
+    # make the offsite for the transition states - each iteration writes only its own
+    # TransOffSiteCount entry, so the rebuild is safe to run in parallel. The Metropolis
+    # loop above stays serial, since each trial depends on the state left by the last.
+    for TsInteractIdx in prange(TSInteractSites.shape[0]):
+        TransOffSiteCount[TsInteractIdx] = 0
+        for Siteind in range(numSitesTSInteracts[TsInteractIdx]):
+            if mobOcc[TSInteractSites[TsInteractIdx, Siteind]] != TSInteractSpecs[TsInteractIdx, Siteind]:
+                TransOffSiteCount[TsInteractIdx] += 1
+
+    return delE
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def MCSweepBatchJit(mobOccBatch, OffSiteCountBatch, SwapTrialsBatch, betas, randarrBatch,
+                    Nswaptrials, Nspecs, ssIndPtr, ssIndices, ssEnergies):
+    """
+    Run independent Metropolis chains (replicas) in parallel - one chain per row of the
+    batch arrays, each with its own temperature, trial list and offsite count scratch.
+    The chains never share mutable state, so prange over replicas is race-free.
+    :return: the energy changes of each chain's last attempted swap.
+    """
+    Nreplica = mobOccBatch.shape[0]
+    delEs = np.zeros(Nreplica)
+    for r in prange(Nreplica):
+        delEs[r] = MCSweepTrialsJit(mobOccBatch[r], OffSiteCountBatch[r], SwapTrialsBatch[r],
+                                    betas[r], randarrBatch[r], Nswaptrials,
+                                    Nspecs, ssIndPtr, ssIndices, ssEnergies)
+    return delEs
+
+
+@jit(nopython=True, cache=True)
+def ExpandJit(state, ijList, dxList, OffSiteCount, TSOffSiteCount, lenVecClus, beta,
+              vacSiteInd, Nspecs, ssIndPtr, ssIndices, ssEnergies,
+              VecsFlat, VecGroupsFlat, VecOffsets, FinSiteFinSpecJumpInd,
+              jumpPtr, flatJumpInteracts, flatKRAEng):
+    """
+    Jit-compiled kernel for the vector cluster expansion of rates and velocities.
+    Each jump perturbs only the vector groups of clusters touching the two swap
+    sites, so del_lamb is kept sparse: the touched group indices are tracked per
+    jump and Wbar/Bbar accumulate directly over the touched pairs, instead of
+    materializing dense per-jump matrices.
+    """
+    Wbar = np.zeros((lenVecClus, lenVecClus))
+    Bbar = np.zeros(lenVecClus)
+
+    del_lamb = np.zeros((lenVecClus, 3))
+    touchedGroups = np.zeros(lenVecClus, dtype=np.int64)
+    groupTouched = np.zeros(lenVecClus, dtype=np.int64)
+
+    siteA = vacSiteInd
+    # go through all the transitions
+    for jumpInd in range(ijList.shape[0]):
+        nTouchGp = 0
+
+        # Get the transition index
+        siteB, specB = ijList[jumpInd], state[ijList[jumpInd]]
+        transInd = FinSiteFinSpecJumpInd[siteB, specB]
+
+        # First, work on getting the KRA energy for the jump - all the TS interactions
+        # for this transition sit in one contiguous slice of the flattened arrays
+        delEKRA = 0.0
+        for k in range(jumpPtr[transInd], jumpPtr[transInd + 1]):
+            # Check if this interaction is on
+            if TSOffSiteCount[flatJumpInteracts[k]] == 0:
+                delEKRA += flatKRAEng[k]
+
+        # next, calculate the energy change due to site swapping
+
+        delE = 0.0
+        # Switch required sites off
+        keyAA = siteA * Nspecs + state[siteA]
+        for k in range(ssIndPtr[keyAA], ssIndPtr[keyAA + 1]):
+            # check if an interaction is on
+            interMainInd = ssIndices[k]
+            if OffSiteCount[interMainInd] == 0:
+                delE -= ssEnergies[k]
+                # take away the vectors for this interaction
+                for i in range(VecOffsets[interMainInd], VecOffsets[interMainInd + 1]):
+                    gp = VecGroupsFlat[i]
+                    if groupTouched[gp] == 0:
+                        groupTouched[gp] = 1
+                        touchedGroups[nTouchGp] = gp
+                        nTouchGp += 1
+                    del_lamb[gp] -= VecsFlat[i]
+            OffSiteCount[interMainInd] += 1
+
+        keyBB = siteB * Nspecs + state[siteB]
+        for k in range(ssIndPtr[keyBB], ssIndPtr[keyBB + 1]):
+            interMainInd = ssIndices[k]
+            if OffSiteCount[interMainInd] == 0:
+                delE -= ssEnergies[k]
+                for i in range(VecOffsets[interMainInd], VecOffsets[interMainInd + 1]):
+                    gp = VecGroupsFlat[i]
+                    if groupTouched[gp] == 0:
+                        groupTouched[gp] = 1
+                        touchedGroups[nTouchGp] = gp
+                        nTouchGp += 1
+                    del_lamb[gp] -= VecsFlat[i]
+            OffSiteCount[interMainInd] += 1
+
+        # Next, switch required sites on
+        keyAB = siteA * Nspecs + state[siteB]
+        for k in range(ssIndPtr[keyAB], ssIndPtr[keyAB + 1]):
+            interMainInd = ssIndices[k]
+            OffSiteCount[interMainInd] -= 1
+            if OffSiteCount[interMainInd] == 0:
+                delE += ssEnergies[k]
+                # add the vectors for this interaction
+                for i in range(VecOffsets[interMainInd], VecOffsets[interMainInd + 1]):
+                    gp = VecGroupsFlat[i]
+                    if groupTouched[gp] == 0:
+                        groupTouched[gp] = 1
+                        touchedGroups[nTouchGp] = gp
+                        nTouchGp += 1
+                    del_lamb[gp] += VecsFlat[i]
+
+        keyBA = siteB * Nspecs + state[siteA]
+        for k in range(ssIndPtr[keyBA], ssIndPtr[keyBA + 1]):
+            interMainInd = ssIndices[k]
+            OffSiteCount[interMainInd] -= 1
+            if OffSiteCount[interMainInd] == 0:
+                delE += ssEnergies[k]
+                # add the vectors for this interaction
+                # interactions with no vector basis get an empty VecOffsets range and the
+                # loop doesn't run
+                for i in range(VecOffsets[interMainInd], VecOffsets[interMainInd + 1]):
+                    gp = VecGroupsFlat[i]
+                    if groupTouched[gp] == 0:
+                        groupTouched[gp] = 1
+                        touchedGroups[nTouchGp] = gp
+                        nTouchGp += 1
+                    del_lamb[gp] += VecsFlat[i]
+
+        # Energy change computed, now expand
+        rate = np.exp(-(0.5 * delE + delEKRA) * beta)
+
+        # only the touched vector groups have nonzero del_lamb rows, so the rate-weighted
+        # outer products reduce to the O(nTouchGp^2) touched pairs
+        for a in range(nTouchGp):
+            g1 = touchedGroups[a]
+            Bbar[g1] += rate * np.dot(del_lamb[g1, :], dxList[jumpInd, :])
+            for b in range(nTouchGp):
+                g2 = touchedGroups[b]
+                Wbar[g1, g2] += rate * np.dot(del_lamb[g1, :], del_lamb[g2, :])
+
+        # clear only the touched rows for the next jump
+        for a in range(nTouchGp):
+            g1 = touchedGroups[a]
+            del_lamb[g1, :] = 0.
+            groupTouched[g1] = 0
+
+        # Next, restore OffSiteCounts to original values for next jump, as well as
+        # for use in the next MC sweep.
+        # During switch-off operations, offsite counts were increased by one.
+        # So decrease them back by one
+        for k in range(ssIndPtr[keyAA], ssIndPtr[keyAA + 1]):
+            OffSiteCount[ssIndices[k]] -= 1
+
+        for k in range(ssIndPtr[keyBB], ssIndPtr[keyBB + 1]):
+            OffSiteCount[ssIndices[k]] -= 1
+
+        # During switch-on operations, offsite counts were decreased by one.
+        # So increase them back by one
+        for k in range(ssIndPtr[keyAB], ssIndPtr[keyAB + 1]):
+            OffSiteCount[ssIndices[k]] += 1
+
+        for k in range(ssIndPtr[keyBA], ssIndPtr[keyBA + 1]):
+            OffSiteCount[ssIndices[k]] += 1
+
+    return Wbar, Bbar
+
+
 class MCSamplerClass(object):
 
     def __init__(self, numSitesInteracts, SupSitesInteracts, SpecOnInteractSites, Interaction2En, numVecsInteracts,
@@ -394,185 +758,84 @@ class MCSamplerClass(object):
         self.Nsites, self.Nspecs = numInteractsSiteSpec.shape[0], numInteractsSiteSpec.shape[1]
         self.mobOcc = mobOcc
 
+        # Flatten the vector basis data into a CSR layout for the Expand kernel - one
+        # contiguous (totalVecs, 3) block of vectors with per-interaction offsets, instead
+        # of the padded (numInteracts, 3, 3) array. numVecsInteracts is -1 for interactions
+        # without a vector basis, which clips to an empty range.
+        nVecs = np.clip(numVecsInteracts, 0, None)
+        self.VecOffsets = np.zeros(len(nVecs) + 1, dtype=int)
+        self.VecOffsets[1:] = np.cumsum(nVecs)
+        activeVecs = np.arange(VecsInteracts.shape[1])[None, :] < nVecs[:, None]
+        self.VecsFlat = VecsInteracts[activeVecs]
+        # the flattened index arrays feed only the module-level kernels, so they can be
+        # narrowed to int32 - halves the bandwidth of the bandwidth-bound sweep loops.
+        # The inputs stay int64, since the jitclass sampler in MC_JIT specs them as such.
+        self.VecGroupsFlat = VecGroupInteracts[activeVecs].astype(np.int32)
+
+        # Do the same for the (site, species) interaction slices - the dense
+        # (Nsites, Nspecs, maxInteractCount) array is mostly padding, so the sweep and
+        # expansion kernels walk a CSR layout keyed on site*Nspecs + spec instead.
+        nInts = numInteractsSiteSpec.reshape(-1)
+        self.ssIndPtr = np.zeros(nInts.shape[0] + 1, dtype=int)
+        self.ssIndPtr[1:] = np.cumsum(nInts)
+        validInts = np.arange(SiteSpecInterArray.shape[2])[None, :] < nInts[:, None]
+        self.ssIndices = SiteSpecInterArray.reshape(nInts.shape[0], -1)[validInts].astype(np.int32)
+        # energies gathered into the same CSR order - the kernels then stream the energy
+        # of slice entry k instead of chasing Interaction2En through the index they just
+        # loaded, leaving OffSiteCount as the only random access in the inner loops.
+        self.ssEnergies = Interaction2En[self.ssIndices]
+
         # generate offsite counts for state interactions
-        self.OffSiteCount = np.zeros(len(numSitesInteracts), dtype=int)
-        for interactIdx in range(len(numSitesInteracts)):
-            numSites = numSitesInteracts[interactIdx]
-            for intSiteind in range(numSites):
-                interSite = SupSitesInteracts[interactIdx, intSiteind]
-                interSpec = SpecOnInteractSites[interactIdx, intSiteind]
-                if mobOcc[interSite] != interSpec:
-                    self.OffSiteCount[interactIdx] += 1
+        self.OffSiteCount = self.getOffSiteCount(mobOcc)
+
+        # Flatten the KRA point group data the same way - the Expand kernel then scans one
+        # contiguous slice per transition instead of the padded (transition, ptGroup, interaction)
+        # arrays.
+        validPtGps = np.arange(numTSInteractsInPtGroups.shape[1])[None, :] < numJumpPointGroups[:, None]
+        TScounts = np.where(validPtGps, numTSInteractsInPtGroups, 0)
+        self.jumpPtr = np.zeros(TScounts.shape[0] + 1, dtype=int)
+        self.jumpPtr[1:] = np.cumsum(TScounts.sum(axis=1))
+        validTS = np.arange(JumpInteracts.shape[2])[None, None, :] < TScounts[:, :, None]
+        self.flatJumpInteracts = JumpInteracts[validTS].astype(np.int32)
+        self.flatKRAEng = Jump2KRAEng[validTS]
+
+    def getOffSiteCount(self, mobOcc):
+        """
+        Compute the offsite counts of every interaction for a state - vectorized over the
+        padded (numInteracts, maxOrder) arrays, with the -1 padding masked out by the site
+        counts. A batch of states stacked along a leading axis gives one row of counts per
+        state, which is how fresh replicas are seeded for the batch sweeps.
+        """
+        validSites = np.arange(self.SupSitesInteracts.shape[1])[None, :] < self.numSitesInteracts[:, None]
+        return np.count_nonzero((mobOcc[..., self.SupSitesInteracts] != self.SpecOnInteractSites) & validSites,
+                                axis=-1)
 
     def makeMCsweep(self, mobOcc, OffSiteCount, TransOffSiteCount,
                     SwapTrials, beta, randarr, Nswaptrials):
 
         # TODO : Need to implement biased sampling methods to select sites from TSinteractions with more prob.
-        for swapcount in range(Nswaptrials):
-            # first select two random sites to swap - for now, let's just select naively.
-            siteA = SwapTrials[swapcount, 0]
-            siteB = SwapTrials[swapcount, 1]
-
-            specA = mobOcc[siteA]
-            specB = mobOcc[siteB]
-
-            delE = 0.
-            # Next, switch required sites off
-            for interIdx in range(self.numInteractsSiteSpec[siteA, specA]):
-                # check if an interaction is on
-                interMainInd = self.SiteSpecInterArray[siteA, specA, interIdx]
-                # offscount = OffSiteCount[interMainInd]
-                if OffSiteCount[interMainInd] == 0:
-                    delE -= self.Interaction2En[interMainInd]
-                OffSiteCount[interMainInd] += 1
-
-            for interIdx in range(self.numInteractsSiteSpec[siteB, specB]):
-                interMainInd = self.SiteSpecInterArray[siteB, specB, interIdx]
-                # offscount = OffSiteCount[interMainInd]
-                if OffSiteCount[interMainInd] == 0:
-                    delE -= self.Interaction2En[interMainInd]
-                OffSiteCount[interMainInd] += 1
-
-            # Next, switch required sites on
-            for interIdx in range(self.numInteractsSiteSpec[siteA, specB]):
-                interMainInd = self.SiteSpecInterArray[siteA, specB, interIdx]
-                OffSiteCount[interMainInd] -= 1
-                if OffSiteCount[interMainInd] == 0:
-                    delE += self.Interaction2En[interMainInd]
-
-            for interIdx in range(self.numInteractsSiteSpec[siteB, specA]):
-                interMainInd = self.SiteSpecInterArray[siteB, specA, interIdx]
-                OffSiteCount[interMainInd] -= 1
-                if OffSiteCount[interMainInd] == 0:
-                    delE += self.Interaction2En[interMainInd]
-
-            self.delE = delE  # for testing purposes
-            # do the selection test
-            if -beta * delE > randarr[swapcount]:
-                # swap the sites to get to the next state
-                mobOcc[siteA] = specB
-                mobOcc[siteB] = specA
-                # OffSiteCount is already updated to that of the new state.
-
-            else:
-                # revert back the off site counts, because the state has not changed
-                for interIdx in range(self.numInteractsSiteSpec[siteA, specA]):
-                    # interMainInd = self.SiteSpecInterArray[siteA, specA, interIdx]
-                    OffSiteCount[self.SiteSpecInterArray[siteA, specA, interIdx]] -= 1
-
-                for interIdx in range(self.numInteractsSiteSpec[siteB, specB]):
-                    # interMainInd = self.SiteSpecInterArray[siteB, specB, interIdx]
-                    OffSiteCount[self.SiteSpecInterArray[siteB, specB, interIdx]] -= 1
-
-                for interIdx in range(self.numInteractsSiteSpec[siteA, specB]):
-                    # interMainInd = self.SiteSpecInterArray[siteA, specB, interIdx]
-                    OffSiteCount[self.SiteSpecInterArray[siteA, specB, interIdx]] += 1
-
-                for interIdx in range(self.numInteractsSiteSpec[siteB, specA]):
-                    # interMainInd = self.SiteSpecInterArray[siteB, specA, interIdx]
-                    OffSiteCount[self.SiteSpecInterArray[siteB, specA, interIdx]] += 1
-
-        # make the offsite for the transition states
-        for TsInteractIdx in range(len(self.TSInteractSites)):
-            TransOffSiteCount[TsInteractIdx] = 0
-            for Siteind in range(self.numSitesTSInteracts[TsInteractIdx]):
-                if mobOcc[self.TSInteractSites[TsInteractIdx, Siteind]] != self.TSInteractSpecs[TsInteractIdx, Siteind]:
-                    TransOffSiteCount[TsInteractIdx] += 1
+        # The swap loop is jit-compiled - the interpreter overhead dominates the scalar indexing otherwise.
+        self.delE = MCSweepJit(mobOcc, OffSiteCount, TransOffSiteCount, SwapTrials, beta, randarr, Nswaptrials,
+                               self.Nspecs, self.ssIndPtr, self.ssIndices, self.ssEnergies,
+                               self.numSitesTSInteracts, self.TSInteractSites, self.TSInteractSpecs)  # for testing purposes
+
+    def makeMCsweepBatch(self, mobOccBatch, OffSiteCountBatch, SwapTrialsBatch, betas, randarrBatch, Nswaptrials):
+        """
+        Sweep a batch of independent chains in parallel - one row per replica, typically
+        at different temperatures for annealing or parallel tempering. The chains are
+        updated in place; transition state offsite counts are not maintained here, since
+        the batch sweeps are meant for thermal sampling rather than KMC stepping.
+        """
+        self.delEBatch = MCSweepBatchJit(mobOccBatch, OffSiteCountBatch, SwapTrialsBatch, betas, randarrBatch,
+                                         Nswaptrials, self.Nspecs, self.ssIndPtr, self.ssIndices,
+                                         self.ssEnergies)
 
     def Expand(self, state, ijList, dxList, OffSiteCount, TSOffSiteCount, lenVecClus, beta):
 
-        del_lamb_mat = np.zeros((lenVecClus, lenVecClus, ijList.shape[0]))
-        delxDotdelLamb = np.zeros((lenVecClus, ijList.shape[0]))
-
-        ratelist = np.zeros(ijList.shape[0])
-
-        siteA, specA = self.vacSiteInd, self.Nspecs - 1
-        # go through all the transitions
-        for jumpInd in range(ijList.shape[0]):
-            del_lamb = np.zeros((lenVecClus, 3))
-
-            # Get the transition index
-            siteB, specB = ijList[jumpInd], state[ijList[jumpInd]]
-            transInd = self.FinSiteFinSpecJumpInd[siteB, specB]
-
-            # First, work on getting the KRA energy for the jump
-            delEKRA = 0.0
-            # We need to go through every point group for this jump
-            for tsPtGpInd in range(self.numJumpPointGroups[transInd]):
-                for interactInd in range(self.numTSInteractsInPtGroups[transInd, tsPtGpInd]):
-                    # Check if this interaction is on
-                    interactMainInd = self.JumpInteracts[transInd, tsPtGpInd, interactInd]
-                    if TSOffSiteCount[interactMainInd] == 0:
-                        delEKRA += self.Jump2KRAEng[transInd, tsPtGpInd, interactInd]
-
-            # next, calculate the energy change due to site swapping
-
-            delE = 0.0
-            # Switch required sites off
-            for interIdx in range(self.numInteractsSiteSpec[siteA, state[siteA]]):
-                # check if an interaction is on
-                interMainInd = self.SiteSpecInterArray[siteA, state[siteA], interIdx]
-                if OffSiteCount[interMainInd] == 0:
-                    delE -= self.Interaction2En[interMainInd]
-                    # take away the vectors for this interaction
-                    for i in range(self.numVecsInteracts[interMainInd]):
-                        del_lamb[self.VecGroupInteracts[interMainInd, i]] -= self.VecsInteracts[interMainInd, i, :]
-                OffSiteCount[interMainInd] += 1
-
-            for interIdx in range(self.numInteractsSiteSpec[siteB, state[siteB]]):
-                interMainInd = self.SiteSpecInterArray[siteB, state[siteB], interIdx]
-                if OffSiteCount[interMainInd] == 0:
-                    delE -= self.Interaction2En[interMainInd]
-                    for i in range(self.numVecsInteracts[interMainInd]):
-                        del_lamb[self.VecGroupInteracts[interMainInd, i]] -= self.VecsInteracts[interMainInd, i, :]
-                # OffSiteCount[interMainInd] += 1
-
-            # Next, switch required sites on
-            for interIdx in range(self.numInteractsSiteSpec[siteA, state[siteB]]):
-                interMainInd = self.SiteSpecInterArray[siteA, state[siteB], interIdx]
-                OffSiteCount[interMainInd] -= 1
-                if OffSiteCount[interMainInd] == 0:
-                    delE += self.Interaction2En[interMainInd]
-                    # add the vectors for this interaction
-                    for i in range(self.numVecsInteracts[interMainInd]):
-                        del_lamb[self.VecGroupInteracts[interMainInd, i]] += self.VecsInteracts[interMainInd, i, :]
-
-            for interIdx in range(self.numInteractsSiteSpec[siteB, state[siteA]]):
-                interMainInd = self.SiteSpecInterArray[siteB, state[siteA], interIdx]
-                OffSiteCount[interMainInd] -= 1
-                if OffSiteCount[interMainInd] == 0:
-                    delE += self.Interaction2En[interMainInd]
-                    # add the vectors for this interaction
-                    for i in range(self.numVecsInteracts[interMainInd]):
-                        del_lamb[self.VecGroupInteracts[interMainInd, i]] += self.VecsInteracts[interMainInd, i, :]
-
-            # Energy change computed, now expand
-            ratelist[jumpInd] = np.exp(-(0.5 * delE + delEKRA) * beta)
-            del_lamb_mat[:, :, jumpInd] = np.dot(del_lamb, del_lamb.T)
-
-            delxDotdelLamb[:, jumpInd] = np.tensordot(del_lamb, dxList[jumpInd], axes=(1, 0))
-
-            # Next, restore OffSiteCounts to original values for next jump, as well as
-            # for use in the next MC sweep.
-            # During switch-off operations, offsite counts were increased by one.
-            # So decrease them back by one
-            for interIdx in range(self.numInteractsSiteSpec[siteA, state[siteA]]):
-                OffSiteCount[self.SiteSpecInterArray[siteA, state[siteA], interIdx]] -= 1
-
-            # During switch-on operations, offsite counts were decreased by one.
-            # So increase them back by one
-            for interIdx in range(self.numInteractsSiteSpec[siteA, state[siteB]]):
-                OffSiteCount[self.SiteSpecInterArray[siteA, state[siteB], interIdx]] += 1
-
-            for interIdx in range(self.numInteractsSiteSpec[siteB, state[siteA]]):
-                OffSiteCount[self.SiteSpecInterArray[siteB, state[siteA], interIdx]] += 1
-
-        ax2 = np.array((0, 2))
-        ax3 = np.array((0, 1))
-        Wbar = np.tensordot(ratelist, del_lamb_mat, axes=ax2)
-        Bbar = np.tensordot(ratelist, delxDotdelLamb, axes=ax3)
-
-        return Wbar, Bbar
+        return ExpandJit(state, ijList, dxList, OffSiteCount, TSOffSiteCount, lenVecClus, beta,
+                         self.vacSiteInd, self.Nspecs, self.ssIndPtr, self.ssIndices,
+                         self.ssEnergies, self.VecsFlat, self.VecGroupsFlat, self.VecOffsets,
+                         self.FinSiteFinSpecJumpInd, self.jumpPtr, self.flatJumpInteracts, self.flatKRAEng)
                 
 
 
@@ -15,8 +15,10 @@ def DoRandSwap(state, Ntrials, vacSiteInd):
 
     count = 0
     while count < Ntrials:
+        # draw distinct sites by construction - siteB is a uniform draw over the other
+        # Nsite - 1 sites, which matches rejecting equal pairs but costs no retries.
         siteA = np.random.randint(0, Nsite)
-        siteB = np.random.randint(0, Nsite)
+        siteB = (siteA + 1 + np.random.randint(0, Nsite - 1)) % Nsite
 
         if state[siteA] == state[siteB] or siteA == vacSiteInd or siteB == vacSiteInd:
             continue
@@ -29,6 +31,7 @@ def DoRandSwap(state, Ntrials, vacSiteInd):
         temp = state[siteA]
         state[siteA] = state[siteB]
         state[siteB] = temp
+        count += 1
 
     return initSiteList, finSiteList
 
@@ -111,9 +114,10 @@ class MCSamplerClass(object):
         count = 0  # to keep a steady count of accepted moves
         swapcount = 0
         while swapcount < Nswaptrials:
-            # first select two random sites to swap - for now, let's just select naively.
+            # select two distinct random sites to swap - the offset draw makes siteB
+            # uniform over the other Nsites - 1 sites, so equal pairs never need retrying.
             siteA = np.random.randint(0, Nsites)
-            siteB = np.random.randint(0, Nsites)
+            siteB = (siteA + 1 + np.random.randint(0, Nsites - 1)) % Nsites
 
             specA = mobOcc[siteA]
             specB = mobOcc[siteB]
@@ -204,9 +208,10 @@ class MCSamplerClass(object):
         swapcount = 0
 
         while swapcount < Nswaptrials:
-            # first select two random sites to swap - for now, let's just select naively.
+            # select two distinct random sites to swap - the offset draw makes siteB
+            # uniform over the other Nsites - 1 sites, so equal pairs never need retrying.
             siteA = np.random.randint(0, Nsites)
-            siteB = np.random.randint(0, Nsites)
+            siteB = (siteA + 1 + np.random.randint(0, Nsites - 1)) % Nsites
 
             specA = mobOcc[siteA]
             specB = mobOcc[siteB]
@@ -32,6 +32,10 @@ class KRAExpand(object):
         self.Nvac = Nvac  # How many vacancies at max should there be in a cluster
         self.vacSpec = NSpec - 1
 
+        # memo for supercell index lookups - sup.index is a pure function of the
+        # geometry, and GroupTransClusters/GetKRA ask for the same sites repeatedly.
+        self._siteIndCache = {}
+
         # Index the jump network into an array
         self.IndexJumps()
         # First, we reform the jumpnetwork
@@ -40,9 +44,19 @@ class KRAExpand(object):
         self.clusterSpeciesJumps = self.defineTransSpecies()
         self.assignTransInd()
 
+    def siteSupInd(self, site):
+        try:
+            return self._siteIndCache[site]
+        except KeyError:
+            ind = self.sup.index(site.R, site.ci)[0]
+            self._siteIndCache[site] = ind
+            return ind
+
     def IndexJumps(self):
         jumpFinSite = []
         jumpdx = []
+        # the vacancy's supercell index doesn't change between jumps - look it up once
+        vacSupInd = self.sup.index(self.vacSite.R, self.vacSite.ci)[0]
         for jump in [jmp for jmpList in self.jumpnetwork for jmp in jmpList]:
 
             siteA = cluster.ClusterSite(ci=(self.chem, jump[0][0]), R=np.zeros(3, dtype=int))
@@ -60,7 +74,7 @@ class KRAExpand(object):
             siteB = cluster.ClusterSite(ci=(self.chem, jump[0][1]), R=Rj)
 
             indA = self.sup.index(siteA.R, siteA.ci)[0]
-            assert indA == self.sup.index(self.vacSite.R, self.vacSite.ci)[0]
+            assert indA == vacSupInd
             indB = self.sup.index(siteB.R, siteB.ci)[0]
 
             jumpFinSite.append(indB)
@@ -83,8 +97,8 @@ class KRAExpand(object):
                 if siteA != self.vacSite:  # If the jump is not out of the vacancy site, don't consider it.
                     continue
 
-                IndA = self.sup.index(siteA.R, siteA.ci)[0]
-                IndB = self.sup.index(siteB.R, siteB.ci)[0]
+                IndA = self.siteSupInd(siteA)
+                IndB = self.siteSupInd(siteB)
                 if clust.Norder == 0:
                     continue
                 TransClustersAll[(IndA, IndB)].append(clust)
@@ -175,9 +189,16 @@ class KRAExpand(object):
         # Now, check which clusters are on and calculate the KRA values
         DelEKRA = 0
         # How do we speed this up?
-        for interactIdx, (tups, clusterList) in zip(itertools.count(), SymClusterlists):
+        for interactIdx, (tups, clusterList) in enumerate(SymClusterlists):
             for clust in clusterList:
-                if all(mobOcc[spec, self.sup.index(site.R, site.ci)[0]] == 1 for spec, site in zip(tups, clust.sites[2:])):
+                # explicit loop with early exit - cheaper than spinning up a generator
+                # for every cluster just to feed all()
+                on = True
+                for spec, site in zip(tups, clust.sites[2:]):
+                    if mobOcc[spec, self.siteSupInd(site)] != 1:
+                        on = False
+                        break
+                if on:
                     DelEKRA += KRACoeffs[interactIdx]
         return DelEKRA
         # Next, we need the contributions of the initial and final states.
@@ -188,8 +209,7 @@ class KRAExpand(object):
         self.jump2Index = {}
         self.Index2Jump = {}
 
-        for jumpInd, (Jumpkey, interactGroupList) in zip(itertools.count(),
-                                                         self.clusterSpeciesJumps.items()):
+        for jumpInd, (Jumpkey, interactGroupList) in enumerate(self.clusterSpeciesJumps.items()):
 
             self.jump2Index[Jumpkey] = jumpInd
             self.Index2Jump[jumpInd] = Jumpkey
@@ -268,7 +288,7 @@ class KRAExpand(object):
 
         for index, TSInteract in Index2TSinteractDict.items():
             numSitesTSInteracts[index] = len(TSInteract)
-            for siteIdx, (site, spec) in zip(itertools.count(), TSInteract):
+            for siteIdx, (site, spec) in enumerate(TSInteract):
                 TSInteractSites[index, siteIdx] = site
                 TSInteractSpecs[index, siteIdx] = spec
 
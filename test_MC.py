@@ -902,6 +902,115 @@ class Test_MC(Test_MC_Arrays):
 
         self.assertTrue(np.allclose(Bbar, Bbar_test))
 
+    def test_Offsite_batch(self):
+        """
+        To test the batch path of getOffSiteCount against per-state calls and explicit counting
+        """
+        MCSampler = self.MCSampler
+        Nsites = len(self.VclusExp.sup.mobilepos)
+        Nreplica = 2
+
+        stateBatch = np.random.randint(0, self.NSpec - 1, (Nreplica, Nsites))
+        stateBatch[:, self.vacsiteInd] = self.NSpec - 1
+
+        offscBatch = MCSampler.getOffSiteCount(stateBatch)
+        self.assertEqual(offscBatch.shape, (Nreplica, self.numSitesInteracts.shape[0]))
+
+        for rep in range(Nreplica):
+            # each batch row must match the single-state path
+            self.assertTrue(np.array_equal(offscBatch[rep], MCSampler.getOffSiteCount(stateBatch[rep])))
+            # and the explicitly counted offsites
+            for interactIdx in range(self.numSitesInteracts.shape[0]):
+                offcount = 0
+                for intSiteind in range(self.numSitesInteracts[interactIdx]):
+                    interSite = self.SupSitesInteracts[interactIdx, intSiteind]
+                    interSpec = self.SpecOnInteractSites[interactIdx, intSiteind]
+                    if stateBatch[rep, interSite] != interSpec:
+                        offcount += 1
+                self.assertEqual(offscBatch[rep, interactIdx], offcount)
+
+    def test_batch_sweep(self):
+        """
+        To test that sweeping a batch of replicas gives the same chains as running each
+        replica through the single-chain sweep.
+        """
+        MCSampler = self.MCSampler
+        Nsites = len(self.VclusExp.sup.mobilepos)
+        Nreplica = 3
+        Nswaptrials = 20
+
+        # build the replica states and their trial site pairs and acceptance draws -
+        # the sweep kernels take caller-supplied trials, so identical inputs must give
+        # identical chains whether run singly or in a batch.
+        betas = np.array([0.5, 1.0, 2.0])
+        stateBatch = np.random.randint(0, self.NSpec - 1, (Nreplica, Nsites))
+        stateBatch[:, self.vacsiteInd] = self.NSpec - 1
+        SwapTrialsBatch = np.zeros((Nreplica, Nswaptrials, 2), dtype=int)
+        randarrBatch = np.log(np.random.rand(Nreplica, Nswaptrials))
+        for rep in range(Nreplica):
+            count = 0
+            while count < Nswaptrials:
+                siteA = np.random.randint(0, Nsites)
+                siteB = np.random.randint(0, Nsites)
+                if siteA == siteB or siteA == self.vacsiteInd or siteB == self.vacsiteInd:
+                    continue
+                SwapTrialsBatch[rep, count, 0] = siteA
+                SwapTrialsBatch[rep, count, 1] = siteB
+                count += 1
+
+        # single-chain reference - run each replica through makeMCsweep
+        stateSingle = stateBatch.copy()
+        offscSingle = MCSampler.getOffSiteCount(stateSingle)
+        delESingle = np.zeros(Nreplica)
+        TSOffSiteCount = np.zeros(len(self.numSitesTSInteracts), dtype=int)
+        for rep in range(Nreplica):
+            MCSampler.makeMCsweep(stateSingle[rep], offscSingle[rep], TSOffSiteCount,
+                                  SwapTrialsBatch[rep], betas[rep], randarrBatch[rep], Nswaptrials)
+            delESingle[rep] = MCSampler.delE
+
+        # now the same replicas as one batch
+        stateRun = stateBatch.copy()
+        offscRun = MCSampler.getOffSiteCount(stateRun)
+        MCSampler.makeMCsweepBatch(stateRun, offscRun, SwapTrialsBatch, betas, randarrBatch, Nswaptrials)
+
+        self.assertTrue(np.array_equal(stateRun, stateSingle))
+        self.assertTrue(np.array_equal(offscRun, offscSingle))
+        self.assertTrue(np.allclose(MCSampler.delEBatch, delESingle))
+        # the chains must actually have evolved for the comparison to mean anything
+        self.assertFalse(np.array_equal(stateRun, stateBatch))
+
+    def test_expansion_python_class(self):
+        """
+        To test that the python-side sampler's Expand matches the jitclass version
+        """
+        MCSampler = self.MCSampler
+        MCSampler_Jit = self.MCSampler_Jit
+
+        state = self.initState.copy()
+
+        TransOffSiteCount = np.zeros(len(self.TSInteractSites), dtype=int)
+        for TsInteractIdx in range(len(TransOffSiteCount)):
+            for Siteind in range(self.numSitesTSInteracts[TsInteractIdx]):
+                if state[self.TSInteractSites[TsInteractIdx, Siteind]] != self.TSInteractSpecs[TsInteractIdx, Siteind]:
+                    TransOffSiteCount[TsInteractIdx] += 1
+
+        ijList, dxList = self.VclusExp.KRAexpander.ijList.copy(), self.VclusExp.KRAexpander.dxList.copy()
+        lenVecClus = len(self.VclusExp.vecClus)
+
+        offscjit = MCSampler_Jit.OffSiteCount.copy()
+        WbarJit, BbarJit = MCSampler_Jit.Expand(state, ijList, dxList, offscjit, TransOffSiteCount.copy(),
+                                                lenVecClus, 1.0)
+
+        offsc = MCSampler.OffSiteCount.copy()
+        Wbar, Bbar = MCSampler.Expand(state, ijList, dxList, offsc, TransOffSiteCount.copy(), lenVecClus, 1.0)
+
+        # the state and offsite counts must come back untouched
+        self.assertTrue(np.array_equal(state, self.initState))
+        self.assertTrue(np.array_equal(offsc, MCSampler.OffSiteCount))
+
+        self.assertTrue(np.allclose(Wbar, WbarJit))
+        self.assertTrue(np.allclose(Bbar, BbarJit))
+
 
 class Test_KMC(Test_MC_Arrays):
 
@@ -1114,7 +1223,7 @@ class test_shells(Test_MC_Arrays):
         ijList = self.VclusExp.KRAexpander.ijList
         dxList = self.VclusExp.KRAexpander.dxList
         Nsites = len(state)
-        Nspec = len(self.VclusExp.mobCountList)
+        Nspec = len(self.mobCountList)
 
         state2Index, Index2State, TransitionRates, TransitionsZero, velocities = MC_JIT.makeShells(self.MCSampler_Jit, self.KMC_Jit, state, offsc,
                                                                                                    TSoffsc, ijList, dxList, beta, Nsites, Nspec,